@@ -0,0 +1,149 @@
+"""Batch driver that overlaps document I/O with parsing and clustering.
+
+Pipeline (each stage connected by a bounded asyncio.Queue, so a slow stage
+applies back-pressure to the ones before it):
+
+    read files (threads) -> parse + cluster + build xml (processes) -> write outputs (threads)
+"""
+import argparse
+import asyncio
+import pathlib
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import os
+
+from doc_parser import populate_document, FORMATS
+from xml_builder import build_xml, xml_path, module_xml_name
+import model
+import output
+
+
+def render_document(file, data, ordered=True, separated=True, dump=True, fmt=None):
+    """CPU work for one document, run inside a worker process.
+
+    Return the text to print to stdout (or None) and the list of (path, bytes) to write.
+    """
+    doc = populate_document(file, data=data, write_clusters=False, fmt=fmt)
+    writes = []
+
+    # same order as main.py: clusters are computed before checking the document
+    for uf in doc.unities:
+        for module in uf.modules:
+            writes.append((module.cluster_path(doc.name), output.encode_text(module.cluster_json())))
+
+    doc.check()
+
+    for uf in doc.unities:
+        for module in uf.modules:
+            writes.append((xml_path(module_xml_name(module), doc.name), build_xml(module)))
+
+    s = doc.str(ordered=ordered, separated=separated)
+    if dump:
+        writes.append((model.Document.questions_path(file.stem), output.encode_text(s)))
+        s = None
+
+    return s, writes
+
+
+async def read_files(files, read_queue, n_parsers, errors):
+    for file in files:
+        try:
+            data = await asyncio.to_thread(file.read_bytes)
+        except OSError as e:
+            # file bloccato o sparito dallo share: lo riportiamo a fine run come gli altri errori
+            errors.append((file, e))
+            continue
+        await read_queue.put((file, data))
+
+    for _ in range(n_parsers):
+        await read_queue.put(None)
+
+
+async def parse_files(read_queue, write_queue, executor, args, errors):
+    loop = asyncio.get_running_loop()
+
+    while True:
+        item = await read_queue.get()
+        if item is None:
+            return
+
+        file, data = item
+        print('Start to work on', file)
+        try:
+            s, writes = await loop.run_in_executor(
+                executor, render_document, file, data, not args.no_ordered, not args.no_separated, not args.no_dump,
+                args.format
+            )
+        except Exception as e:
+            # un documento non valido non deve bloccare gli altri: l'errore è riportato a fine run
+            errors.append((file, e))
+            continue
+
+        if s is not None:
+            print(s)
+
+        for write in writes:
+            await write_queue.put(write)
+
+
+async def write_outputs(write_queue, errors):
+    while True:
+        item = await write_queue.get()
+        if item is None:
+            return
+
+        path, data = item
+        try:
+            await asyncio.to_thread(output.write_bytes, path, data)
+        except OSError as e:
+            # continuiamo a consumare la coda, così i parser non restano bloccati
+            errors.append((path, e))
+
+
+async def run(files, args):
+    """Process files, return the list of (file or output path, exception) that failed"""
+    read_queue = asyncio.Queue(maxsize=args.prefetch)
+    write_queue = asyncio.Queue(maxsize=args.write_queue)
+    errors = []
+
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        writers = [asyncio.create_task(write_outputs(write_queue, errors)) for _ in range(args.writers)]
+        parsers = [parse_files(read_queue, write_queue, executor, args, errors) for _ in range(args.workers)]
+
+        try:
+            await asyncio.gather(read_files(files, read_queue, len(parsers), errors), *parsers)
+        finally:
+            # outputs already queued are always written before returning
+            for _ in writers:
+                await write_queue.put(None)
+            await asyncio.gather(*writers)
+
+    return errors
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('folder', type=str, help='The folder of Word documents to parse')
+    parser.add_argument('-no', '--no-ordered', default=False, action='store_true', help='Don\'t display questions ordered by (min) slide to jump')
+    parser.add_argument('-ns', '--no-separated', default=False, action='store_true', help='Don\'t separate questions in groups')
+    parser.add_argument('-nd', '--no-dump', default=False, action='store_true', help='Dump each question parsed to stdout instead of a textfile with same name of document')
+    parser.add_argument('-f', '--format', choices=list(FORMATS), default=None, help='Format of the documents (default: detected per document)')
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 1, help='Number of processes used to parse documents')
+    parser.add_argument('--writers', type=int, default=4, help='Number of concurrent output writers')
+    parser.add_argument('--prefetch', type=int, default=4, help='Max number of documents read ahead of parsing')
+    parser.add_argument('--write-queue', type=int, default=64, help='Max number of outputs waiting to be written')
+    args = parser.parse_args()
+
+    q_dir = pathlib.Path(args.folder)
+    files = list(q_dir.glob('*.docx')) + list(q_dir.glob('*.doc'))
+
+    errors = asyncio.run(run(files, args))
+
+    print(output.stats)
+    for path in output.stats.changed:
+        print('changed:', path)
+
+    for where, error in errors:
+        print('ERROR on {}: {}'.format(where, error))
+    if errors:
+        sys.exit(1)
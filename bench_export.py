@@ -0,0 +1,95 @@
+"""Compare the per-module cluster json path with the bulk NDJSON export.
+
+Runs on a synthetic in-memory library, so no Word document is needed.
+Cluster labels are computed once and passed to both paths, so only serialization is measured.
+"""
+import argparse
+import io
+import json
+import random
+import timeit
+
+import export
+import model
+
+
+def make_library(n_docs, n_ufs=3, n_modules=4, n_questions=25, seed=0):
+    """Return the documents and a dict (document, uf, module) -> cluster labels"""
+    rnd = random.Random(seed)
+    docs = []
+    labels = {}
+
+    for d in range(n_docs):
+        doc = model.Document('doc_{}'.format(d))
+        global_number = 0
+        for u in range(n_ufs):
+            uf = model.Unity(u, 'unità funzionale {}'.format(u), 10)
+            doc.add_unity(uf)
+            for m in range(n_modules):
+                module = model.Module(m, 'modulo {}'.format(m), 2, unity=uf)
+                uf.add_module(module)
+                for q in range(n_questions):
+                    question = model.Question(q, global_number, 'Qual è la domanda numero {}?'.format(q), module)
+                    question.set_jump2slides({rnd.randint(1, 80) for _ in range(rnd.randint(1, 2))})
+                    correct = rnd.randrange(3)
+                    for a in range(3):
+                        question.add_answer(model.Answer('risposta «{}»'.format(a), is_correct=a == correct))
+                    module.add_question(question)
+                    global_number += 1
+                module.sort_questions()
+                labels[(doc.name, u + 1, m + 1)] = model.cluster_labels(module.cluster_input())
+        docs.append(doc)
+
+    return docs, labels
+
+
+def per_module(docs, labels):
+    for doc in docs:
+        for uf in doc.unities:
+            for module in uf.modules:
+                module.cluster_json(labels[(doc.name, uf.number + 1, module.number + 1)])
+
+
+def bulk_todict(docs, labels):
+    """NDJSON built from the nested todict() of each question, for reference"""
+    f = io.StringIO()
+    for doc in docs:
+        for uf, module, cluster, question in export.iter_questions(doc, labels=labels):
+            record = dict(document=doc.name, uf=uf.number + 1, module=module.number + 1, cluster=cluster)
+            record.update(question.todict())
+            f.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')))
+            f.write('\n')
+
+
+def bulk(docs, **kwargs):
+    export.write_ndjson(docs, io.StringIO(), **kwargs)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-d', '--docs', type=int, default=20, help='Number of synthetic documents')
+    parser.add_argument('-r', '--repeat', type=int, default=5, help='Repetitions (best one is reported)')
+    args = parser.parse_args()
+
+    docs, labels = make_library(args.docs)
+    count = sum(len(m.questions) for doc in docs for uf in doc.unities for m in uf.modules)
+    print('{} documents, {} questions'.format(len(docs), count))
+
+    cases = [
+        ('per-module json (indent=2)', lambda: per_module(docs, labels)),
+        ('ndjson todict() json', lambda: bulk_todict(docs, labels)),
+        ('ndjson json compact', lambda: bulk(docs, backend='json', labels=labels)),
+        ('ndjson json pretty', lambda: bulk(docs, backend='json', compact=False, labels=labels)),
+    ]
+    if export.orjson is not None:
+        cases.append(('ndjson orjson', lambda: bulk(docs, backend='orjson', labels=labels)))
+
+    for name, func in cases:
+        best = min(timeit.repeat(func, number=1, repeat=args.repeat))
+        print('{:<30} {:8.2f} ms'.format(name, best * 1000))
+
+    # sanity check: every line is valid json
+    buffer = io.StringIO()
+    export.write_ndjson(docs[:1], buffer, labels=labels)
+    for line in buffer.getvalue().splitlines():
+        json.loads(line)
@@ -0,0 +1,241 @@
+"""Performance regression gate for the nightly pipeline.
+
+Generates .docx corpora of several sizes (current and legacy format), runs the
+fixed workload parse -> check -> cluster -> xml -> write on each of them and
+records wall time, peak RSS and per-stage timings. The workload of each size runs
+in its own subprocess, so peak RSS is not polluted by corpus generation or by
+the previous sizes.
+
+    python benchmark.py              # compare with benchmark_baseline.json
+    python benchmark.py --update     # store current results as the new baseline
+
+Baselines depend on the machine: update them on the box that runs the gate.
+A missing baseline file, or a requested size missing from it, makes the gate fail
+unless --allow-missing-baseline is given.
+"""
+import argparse
+import contextlib
+import json
+import os
+import pathlib
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import docx
+
+HERE = pathlib.Path(__file__).resolve().parent
+BASELINE_PATH = HERE / 'benchmark_baseline.json'
+
+# name -> (documents, uf per document, modules per uf, questions per module)
+SIZES = {
+    'small': (2, 2, 3, 15),
+    'medium': (6, 3, 4, 25),
+    'large': (20, 4, 5, 30),
+}
+STAGES = ('parse', 'check', 'cluster', 'xml', 'write')
+
+
+def generate_corpus(folder, n_docs, n_ufs, n_modules, n_questions, seed=0):
+    """Write n_docs synthetic Word documents into folder, one every four in legacy format"""
+    rnd = random.Random(seed)
+    folder = pathlib.Path(folder)
+
+    for d in range(n_docs):
+        legacy = d % 4 == 3
+        document = docx.Document()
+        for u in range(n_ufs):
+            document.add_paragraph('UF {} Unità funzionale numero {} ({})'.format(u + 1, u + 1, rnd.randint(5, 40)))
+            for m in range(n_modules):
+                document.add_paragraph('Modulo {} Argomento {} ({})'.format(m + 1, m + 1, rnd.randint(1, 8)))
+                for q in range(n_questions):
+                    slide = rnd.randint(1, 120)
+                    slides = '{}-{}'.format(slide, slide + 1) if rnd.random() < 0.3 else str(slide)
+                    correct = rnd.randrange(3)
+                    answers = ['{}risposta {} all’interrogativo {}'.format('ok ' if i == correct else '', i + 1, q + 1)
+                               for i in range(3)]
+
+                    if legacy:
+                        document.add_paragraph('DOMANDA: Qual è il quesito {} del modulo {}?'.format(q + 1, m + 1))
+                        for letter, answer in zip('ABC', answers):
+                            document.add_paragraph('RISPOSTA {} {}'.format(letter, answer))
+                        document.add_paragraph('slide {}'.format(slides))
+                    else:
+                        document.add_paragraph('Qual è il quesito {} del modulo {}? slide {}'.format(q + 1, m + 1, slides))
+                        document.add_paragraph('a. {} b. {} c. {}'.format(*answers))
+        document.save(str(folder / 'corpus_{:03d}.docx'.format(d)))
+
+
+def run_workload(folder):
+    """Run the fixed workload on every document of folder, return the timings in seconds"""
+    from doc_parser import populate_document
+    from xml_builder import build_xml, xml_path, module_xml_name
+    import output
+
+    stages = defaultdict(float)
+
+    @contextlib.contextmanager
+    def stage(name):
+        start = time.perf_counter()
+        yield
+        stages[name] += time.perf_counter() - start
+
+    start = time.perf_counter()
+    for file in sorted(pathlib.Path(folder).glob('*.docx')):
+        with stage('parse'):
+            doc = populate_document(file, write_clusters=False)
+        with stage('check'):
+            doc.check()
+
+        writes = []
+        with stage('cluster'):
+            for uf in doc.unities:
+                for module in uf.modules:
+                    writes.append((module.cluster_path(doc.name), output.encode_text(module.cluster_json())))
+        with stage('xml'):
+            for uf in doc.unities:
+                for module in uf.modules:
+                    writes.append((xml_path(module_xml_name(module), doc.name), build_xml(module)))
+        with stage('write'):
+            for path, data in writes:
+                output.write_bytes(path, data)
+
+    return dict(wall=time.perf_counter() - start, stages={name: stages[name] for name in STAGES})
+
+
+def run_corpus(corpus, repeat):
+    """Run the workload on corpus repeat times (best timings are kept)"""
+    with tempfile.TemporaryDirectory(prefix='moodle_bench_') as tmp:
+        tmp = pathlib.Path(tmp)
+
+        # outputs go to <tmp>/generated, with the schema available for validation
+        shutil.copy(HERE / 'schema.xsd', tmp / 'schema.xsd')
+        os.chdir(tmp)
+
+        runs = []
+        for _ in range(repeat):
+            shutil.rmtree(tmp / 'generated', ignore_errors=True)
+            runs.append(run_workload(corpus))
+
+    result = dict(
+        wall=min(run['wall'] for run in runs),
+        stages={name: min(run['stages'][name] for run in runs) for name in STAGES},
+        # ru_maxrss is in KiB on Linux
+        peak_rss_mb=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    )
+    return result
+
+
+def run_size(size, repeat):
+    """Generate the corpus of size, then run the workload on it in a fresh subprocess"""
+    with tempfile.TemporaryDirectory(prefix='moodle_corpus_') as corpus:
+        generate_corpus(corpus, *SIZES[size])
+
+        cmd = [sys.executable, str(HERE / 'benchmark.py'), '--child', corpus, '--repeat', str(repeat)]
+        proc = subprocess.run(cmd, cwd=str(HERE), stdout=subprocess.PIPE, check=True, universal_newlines=True)
+
+    # the workload may print something: the result is the last line
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+RSS_METRIC = 'peak rss (MB)'
+
+
+def flatten(result):
+    metrics = {'wall (s)': result['wall'], RSS_METRIC: result['peak_rss_mb']}
+    metrics.update({'{} (s)'.format(name): value for name, value in result['stages'].items()})
+    return metrics
+
+
+def compare(baseline, current, threshold, min_delta, min_delta_rss):
+    """Return the rows of the comparison table and the list of regressions.
+
+    A metric regresses if it is over threshold (relative) and over min_delta seconds
+    (min_delta_rss MB for peak RSS) slower/bigger than the baseline.
+    """
+    rows, regressions = [], []
+
+    for size, result in current.items():
+        old_metrics = flatten(baseline[size]) if size in baseline else {}
+        for metric, new in flatten(result).items():
+            old = old_metrics.get(metric)
+            if old is None:
+                rows.append((size, metric, None, new, 'no baseline'))
+                continue
+
+            ratio = new / old if old else float('inf')
+            # le soglie assolute evitano falsi positivi su valori molto piccoli
+            floor = min_delta_rss if metric == RSS_METRIC else min_delta
+            regressed = ratio > 1 + threshold and new - old > floor
+            status = 'REGRESSION' if regressed else 'ok'
+            rows.append((size, metric, old, new, '{} ({:+.1%})'.format(status, ratio - 1)))
+            if regressed:
+                regressions.append((size, metric))
+
+    return rows, regressions
+
+
+def format_table(rows):
+    def fmt(value):
+        return '-' if value is None else '{:.3f}'.format(value)
+
+    lines = ['{:<8} {:<16} {:>12} {:>12}  {}'.format('size', 'metric', 'baseline', 'current', 'status')]
+    for size, metric, old, new, status in rows:
+        lines.append('{:<8} {:<16} {:>12} {:>12}  {}'.format(size, metric, fmt(old), fmt(new), status))
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-s', '--sizes', nargs='+', choices=list(SIZES), default=list(SIZES), help='Corpus sizes to run')
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='Repetitions per size (best one is kept)')
+    parser.add_argument('-t', '--threshold', type=float, default=0.2, help='Allowed slowdown, as a fraction of the baseline')
+    parser.add_argument('--min-delta', type=float, default=0.01, help='Ignore time regressions smaller than this many seconds')
+    parser.add_argument('--min-delta-rss', type=float, default=5.0, help='Ignore peak RSS regressions smaller than this many MB')
+    parser.add_argument('-b', '--baseline', type=str, default=str(BASELINE_PATH), help='JSON file with the baselines')
+    parser.add_argument('--allow-missing-baseline', default=False, action='store_true', help='Don\'t fail for sizes without a baseline')
+    parser.add_argument('-u', '--update', default=False, action='store_true', help='Store current results as baseline')
+    # used internally: run the workload on an already generated corpus folder
+    parser.add_argument('--child', type=str, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_corpus(args.child, args.repeat)))
+        sys.exit(0)
+
+    current = {}
+    for size in args.sizes:
+        print('Running', size, '...')
+        current[size] = run_size(size, args.repeat)
+
+    baseline_path = pathlib.Path(args.baseline)
+    baseline = json.loads(baseline_path.read_text(encoding='utf-8')) if baseline_path.exists() else {}
+
+    if args.update:
+        baseline.update(current)
+        baseline_path.write_text(json.dumps(baseline, indent=2, sort_keys=True) + '\n', encoding='utf-8')
+        print('Baseline written on', baseline_path)
+        sys.exit(0)
+
+    rows, regressions = compare(baseline, current, args.threshold, args.min_delta, args.min_delta_rss)
+    print(format_table(rows))
+
+    missing = [size for size in current if size not in baseline]
+    if missing:
+        msg = 'no baseline in {} for: {} (run with --update on the reference machine)'.format(
+            baseline_path, ', '.join(missing))
+        if not args.allow_missing_baseline:
+            print('\nERROR: ' + msg)
+            sys.exit(1)
+        print('\nWARNING: ' + msg)
+
+    if regressions:
+        print('\n{} regression(s) over {:.0%}: {}'.format(
+            len(regressions), args.threshold, ', '.join('{} {}'.format(*r) for r in regressions)))
+        sys.exit(1)
+    print('\nNo regression over {:.0%}'.format(args.threshold))
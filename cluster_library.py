@@ -0,0 +1,131 @@
+"""Library-level clustering: cluster every module of every document in parallel.
+
+Documents are parsed first (without clustering), then the slides of each module are
+sent to a pool of worker processes. Results are stored in a single SQLite table
+keyed by (document, uf, module), so documents never overwrite each other.
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import json
+import os
+import pathlib
+import sqlite3
+
+from doc_parser import populate_document, FORMATS
+from model import cluster_labels
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS clusters (
+    document TEXT NOT NULL,
+    uf INTEGER NOT NULL,
+    module INTEGER NOT NULL,
+    module_name TEXT NOT NULL,
+    count_questions INTEGER NOT NULL,
+    count_clusters INTEGER NOT NULL,
+    labels TEXT NOT NULL,
+    clusters TEXT NOT NULL,
+    PRIMARY KEY (document, uf, module)
+)
+'''
+
+
+def iter_modules(docs):
+    """Yield ((document, uf, module), module) for every module of docs (1-based numbers)"""
+    for doc in docs:
+        for uf in doc.unities:
+            for module in uf.modules:
+                yield (doc.name, uf.number + 1, module.number + 1), module
+
+
+def collect_modules(docs):
+    """Dict key -> module of iter_modules, rejecting documents with the same name"""
+    names = set()
+    for doc in docs:
+        if doc.name in names:
+            raise ValueError('Duplicate document name {} (e.g. both .doc and .docx?)'.format(doc.name))
+        names.add(doc.name)
+
+    return dict(iter_modules(docs))
+
+
+def cluster_modules(modules, workers=None):
+    """Cluster modules (a dict key -> model.Module) in parallel, return a dict key -> labels"""
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {key: executor.submit(cluster_labels, module.cluster_input()) for key, module in modules.items()}
+
+        results = {}
+        for key, future in futures.items():
+            try:
+                results[key] = future.result()
+            except RuntimeError as e:
+                raise RuntimeError('{} [document: {}, uf: {}, module: {}]'.format(e, *key))
+
+    return results
+
+
+def save_results(db_path, modules, results, full=False):
+    """Store clustering results into the clusters table of db_path.
+
+    Existing rows of the reclustered documents are deleted first (all rows if full
+    is True), in the same transaction, so removed modules/UF don't linger in the table.
+    """
+    os.makedirs(pathlib.Path(db_path).parent, exist_ok=True)
+
+    rows = []
+    for key, labels in results.items():
+        module = modules[key]
+        thedict = module.clusters_dict(labels)
+        rows.append((
+            *key,
+            module.name,
+            len(labels),
+            thedict['count_clusters'],
+            json.dumps(labels),
+            json.dumps(thedict['clusters'], ensure_ascii=False),
+        ))
+
+    with sqlite3.connect(str(db_path)) as conn:
+        conn.execute(SCHEMA)
+        if full:
+            conn.execute('DELETE FROM clusters')
+        else:
+            documents = sorted({key[0] for key in modules})
+            conn.executemany('DELETE FROM clusters WHERE document = ?', [(doc,) for doc in documents])
+        conn.executemany('INSERT INTO clusters VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+    conn.close()
+
+    return len(rows)
+
+
+def cluster_library(files, db_path, workers=None, fmt=None, full=True):
+    """Cluster all modules of files into db_path.
+
+    If full is True the table is replaced by the results of files (the whole library),
+    otherwise only the rows of these documents are replaced.
+    """
+    docs = []
+    for file in files:
+        print('Parsing', file)
+        doc = populate_document(file, write_clusters=False, fmt=fmt)
+        doc.check()
+        docs.append(doc)
+
+    modules = collect_modules(docs)
+    results = cluster_modules(modules, workers=workers)
+    return save_results(db_path, modules, results, full=full)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('folder', type=str, help='The folder of Word documents to parse')
+    parser.add_argument('-o', '--output', type=str, default='generated/clusters.sqlite', help='SQLite file with clustering results')
+    parser.add_argument('-f', '--format', choices=list(FORMATS), default=None, help='Format of the documents (default: detected per document)')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='Number of processes used for clustering (default: cpu count)')
+    parser.add_argument('-k', '--keep-others', default=False, action='store_true', help='Replace only the documents of folder, keeping the other rows of the table')
+    args = parser.parse_args()
+
+    q_dir = pathlib.Path(args.folder)
+    files = sorted(q_dir.glob('*.docx')) + sorted(q_dir.glob('*.doc'))
+
+    count = cluster_library(files, args.output, workers=args.workers, fmt=args.format, full=not args.keep_others)
+    print(count, 'modules clustered into', args.output)
@@ -0,0 +1,304 @@
+"""Single parser engine for every question format we receive.
+
+Each format is a plugin (subclass of Format) holding its own compiled regexes and
+the handling of question/answer/slide lines; UF and modules are parsed the same way
+by every format. The format of a document is detected from its first matching
+paragraphs, unless explicitly given.
+"""
+from collections import defaultdict
+import io
+import re
+
+import docx
+
+import model
+
+uf_re = re.compile(r'(uf)[^a-z]*([^(]+)[(]?(\d+)?', re.I)
+module_re = re.compile(r'(modulo)[^a-z]*([^(]+)[(]?(\d+)?', re.I)
+
+# eliminiamo caratteri unicode che danno problemi
+_unicode_table = str.maketrans({'–': '-', '’': "'", '‘': "'", '“': '"', '”': '"'})
+# fix lettere accentate
+_accents = dict(zip('aeiouAEIOU', 'àèìòùÀÈÌÒÙ'))
+_accent_re = re.compile(r"([aeiouAEIOU])'")
+_spaces_re = re.compile(r'\s+')
+
+
+def normalize(text):
+    text = text.strip().translate(_unicode_table)
+    if "'" in text:
+        text = _accent_re.sub(lambda m: _accents[m.group(1)], text)
+    return _spaces_re.sub(' ', text).strip()  # sostituiamo più spazi con uno solo + strip
+
+
+class ParserState:
+    def __init__(self, model_doc):
+        self.doc = model_doc
+        self.counts = defaultdict(int)
+        self.uf_before = None
+        self.module_before = None
+        self.question_before = None
+        self.j2s_before = None
+
+
+class Format:
+    """Base format plugin: parses UF and modules, subclasses parse the questions"""
+
+    name = None
+
+    def detect(self, text, test) -> bool:
+        """True if a (normalized) question/answer line looks like this format"""
+        raise NotImplementedError
+
+    def parse_line(self, state, text, test):
+        if test.startswith('uf'):
+            self.parse_unity(state, text)
+        elif test.startswith('modulo'):
+            self.parse_module(state, text)
+        else:
+            self.parse_content(state, text, test)
+
+    def parse_unity(self, state, text):
+        groups = uf_re.search(text).groups()
+        name, duration = groups[1:3]
+        uf = model.Unity(state.counts['uf'], name, duration)
+        state.doc.add_unity(uf)
+
+        state.uf_before = uf
+        state.module_before, state.question_before = [None] * 2
+
+        state.counts['uf'] += 1
+        for kw in ('module', 'question'):
+            state.counts[kw] = 0
+
+    def parse_module(self, state, text):
+        assert state.uf_before, 'Found module without unity!'
+
+        groups = module_re.search(text).groups()
+        name, duration = groups[1:3]
+        module = model.Module(state.counts['module'], name, duration, unity=state.uf_before)
+        state.uf_before.add_module(module)
+
+        state.module_before = module
+        state.question_before = None
+        state.j2s_before = None
+
+        state.counts['module'] += 1
+        state.counts['question'] = 0
+
+    def parse_content(self, state, text, test):
+        raise NotImplementedError
+
+    def add_question(self, state, name):
+        assert state.module_before, 'Found question without module!'
+
+        question = model.Question(state.counts['question'], state.counts['global_question'], name, state.module_before)
+        state.module_before.add_question(question)
+
+        state.counts['question'] += 1
+        state.counts['global_question'] += 1
+
+        return question
+
+
+class CurrentFormat(Format):
+    """Question and slides on one line, answers "a. ... b. ... c. ..." (correct one starts with "ok")"""
+
+    name = 'current'
+
+    question_re = re.compile(r"(.+)(?=\s+\(?slide)\s+\(?slide[s]?\s+((\d+[\s-]?)+)", re.I)
+    answer_re = re.compile(r'(a?\.?\s*(.+?)(?=b\.))(b\.\s+(.+?)(?=c\.))(c\.(\s+.+))', re.I)
+
+    def detect(self, text, test):
+        return bool(self.question_re.match(text) or self.answer_re.match(text))
+
+    def parse_content(self, state, text, test):  # domanda, risposta, o entrambe!
+        question_match = self.question_re.match(text)
+
+        # se questo if è vero, ho sia domanda che risposte sulla stessa riga
+        if question_match and self.answer_re.match(self.question_re.sub("", text).strip()):
+            state.question_before = self.parse_question(state, question_match)
+            self.parse_answer(state, text)
+
+            # reset question
+            state.question_before = None
+
+        # altrimenti ho solo la domanda
+        elif question_match:
+            state.question_before = self.parse_question(state, question_match)
+
+        # altrimenti ho solo le risposte
+        elif self.answer_re.match(text):
+            self.parse_answer(state, text)
+            state.question_before = None
+
+        # altrimenti ho qualche errore
+        else:
+            raise ValueError(f"cannot match anything with: {text}")
+
+    def parse_question(self, state, match):
+        # parse question text and slides number
+        qname, slides = match.group(1, 2)
+
+        question = self.add_question(state, qname)
+
+        # parse slides from regex match
+        slides = set([int(elem) for elem in slides.split("-")])
+        question.set_jump2slides(slides)
+
+        return question
+
+    def parse_answer(self, state, text):
+        question_before = state.question_before
+        assert question_before, 'Found answers without question!'
+
+        # parse answer
+        a, b, c = self.answer_re.match(self.question_re.sub("", text).strip()).group(2, 4, 6)
+
+        for elem in (a, b, c):
+            elem = elem.strip()  # remove start characters
+            if elem.startswith("ok"):
+                elem = elem[2:].strip()
+                is_correct = True
+            else:
+                is_correct = False
+            answer = model.Answer(elem, is_correct=is_correct)
+            question_before.add_answer(answer)
+
+        if not any(answer.is_correct for answer in question_before.answers):
+            raise ValueError(f"No correct answer found for {question_before.name}")
+
+
+class LegacyFormat(Format):
+    """One line each for "DOMANDA: ...", "RISPOSTA A [ok] ..." and "slide N" """
+
+    name = 'legacy'
+
+    question_re = re.compile(r'(domanda)[^a-zA-Z]*(.+)', re.IGNORECASE)
+    answer_re = re.compile(r'(RISPOSTA\s?[A-Z]?)[^\w]*(ok(?=\s+|-+))?[^\w]*(.*)')
+    slide_re = re.compile(r'(\d+)')
+    # forma legacy: "domanda ..." senza "slide N" sulla stessa riga, oppure "risposta [x] ..."
+    detect_re = re.compile(r'domanda\b(?!.*\s\(?slides?\s+\d)|risposta\s?[a-z]?\b')
+
+    def detect(self, text, test):
+        return bool(self.detect_re.match(test)) or self._is_slide(test)
+
+    @staticmethod
+    def _is_slide(test):
+        return test.replace('*', '').strip().startswith('slide')
+
+    def parse_content(self, state, text, test):
+        if test.startswith('domanda'):
+            name = self.question_re.search(text).group(2)
+            question = self.add_question(state, name)
+            state.question_before = question
+
+            if state.j2s_before:
+                question.set_jump2slides(state.j2s_before)
+
+        elif test.startswith('risposta'):
+            assert state.question_before, 'Found answer without question!'
+
+            groups = self.answer_re.search(text).groups()
+            is_correct, name = groups[1:3]
+            is_correct = True if is_correct else False  # fix None
+
+            answer = model.Answer(name, is_correct)
+            state.question_before.add_answer(answer)
+
+        elif self._is_slide(test):
+            slides = set([int(el) for el in self.slide_re.findall(test)])
+
+            # se ho una question before e trovo nuove slides, se
+            # il controllo di validità fallisce allora queste slides sono le sue
+            if state.question_before:
+                try:
+                    state.question_before.check()
+                except AssertionError:
+                    state.question_before.set_jump2slides(slides)
+                # se invece non fallisce, allora queste nuove slides vanno memorizzate
+                # per la prossima question
+                else:
+                    state.j2s_before = slides
+            # se non ho una question before, allora salva queste slides
+            else:
+                state.j2s_before = slides
+
+
+FORMATS = {fmt.name: fmt for fmt in (CurrentFormat(), LegacyFormat())}
+DEFAULT_FORMAT = 'current'
+
+
+def detect_format(lines, sample=5):
+    """Detect format from the first `sample` (normalized) lines matched by a format.
+
+    Lines not matched by any format (titles, teacher, location...) are skipped:
+
+    >>> preamble = ['Corso sicurezza', 'Docente: Rossi', 'Sede: Napoli', 'Aula 3', 'Anno 2021', 'Edizione 2']
+    >>> detect_format(preamble + ['UF 1 rischi (4)', 'Modulo 1 base (2)', 'DOMANDA: cosa?', 'RISPOSTA A ok si']).name
+    'legacy'
+    >>> detect_format(preamble + ['UF 1 rischi (4)', 'Modulo 1 base (2)', 'Cosa? slide 3', 'a. si b. ok no c. forse']).name
+    'current'
+
+    Current questions may start with "Domanda" too:
+
+    >>> detect_format(['UF 1 rischi (4)', 'Modulo 1 base (2)', 'Domanda 1: cosa? slide 3', 'a. ok si b. no c. forse']).name
+    'current'
+    >>> LegacyFormat().detect('Domanda 1: cosa? slide 3', 'domanda 1: cosa? slide 3')
+    False
+    """
+    votes = defaultdict(int)
+    seen = 0
+
+    for text in lines:
+        test = text.lower()
+        if not test or test.startswith(('uf', 'modulo')):
+            continue
+
+        # current prima: una riga con "slide N" o con le risposte a./b./c. è sempre current,
+        # anche se inizia con "Domanda"
+        for name in ('current', 'legacy'):
+            if FORMATS[name].detect(text, test):
+                votes[name] += 1
+                seen += 1
+                break
+
+        if seen >= sample:
+            break
+
+    if not votes:
+        return FORMATS[DEFAULT_FORMAT]
+    return FORMATS[max(votes, key=votes.get)]
+
+
+def populate_document(doc_pathlib, data=None, write_clusters=True, fmt=None):
+    """Parse a Word document into a model.Document.
+
+    If data is given, it's used as the content of the document instead of reading doc_pathlib.
+    If write_clusters is False, clusters are not computed nor written (the caller will do it).
+    fmt is the name of the format to use, if None it's detected from the document.
+    """
+    model_doc = model.Document(doc_pathlib.stem)
+    try:
+        parsed_doc = docx.Document(io.BytesIO(data) if data is not None else str(doc_pathlib))
+    except Exception as e:
+        raise ValueError(str(e) + '.\nDocumento Word non valido oppure aperto e non salvato!')
+
+    lines = [normalize(paragraph.text) for paragraph in parsed_doc.paragraphs]
+    doc_format = FORMATS[fmt] if fmt else detect_format(lines)
+
+    state = ParserState(model_doc)
+    for text in lines:
+        if not text:
+            continue
+        doc_format.parse_line(state, text, text.lower())
+
+    # sort questions based on jump2slide
+    # and also save clusters to json file (under generated/<document name>/)
+    for uf in model_doc.unities:
+        for module in uf.modules:
+            module.sort_questions()
+            if write_clusters:
+                module.write_cluster(root=model_doc.name)
+
+    return model_doc
@@ -0,0 +1,131 @@
+"""Bulk export of the whole library as NDJSON: one line per question.
+
+Records are streamed straight from the model: each question becomes a small flat
+dict encoded on its own, so the nested todict() tree of the library is never built.
+"""
+import argparse
+import json
+import pathlib
+
+from doc_parser import populate_document, FORMATS
+import output
+
+try:
+    import orjson
+except ImportError:  # optional, faster encoder
+    orjson = None
+
+BACKENDS = ('auto', 'json', 'orjson')
+
+
+def _record(doc, uf, module, cluster, question):
+    """Flat record of one question, shared by all backends"""
+    return dict(
+        document=doc.name,
+        uf=uf.number + 1,
+        uf_name=uf.name,
+        module=module.number + 1,
+        module_name=module.name,
+        cluster=cluster,
+        number=question.number + 1,
+        global_number=question.global_number + 1,
+        name=question.name,
+        jump2slide=question.jump2slide,
+        jump2slides=None if question.jump2slides is None else sorted(question.jump2slides),
+        answers=[dict(is_correct=bool(ans.is_correct), text=ans.text) for ans in question.answers],
+    )
+
+
+def _encode_json(doc, uf, module, cluster, question, compact=True):
+    separators = (',', ':') if compact else (', ', ': ')
+    return json.dumps(_record(doc, uf, module, cluster, question), ensure_ascii=False, separators=separators)
+
+
+def _encode_orjson(doc, uf, module, cluster, question, compact=True):
+    # orjson output is always compact
+    return orjson.dumps(_record(doc, uf, module, cluster, question)).decode('utf-8')
+
+
+def get_encoder(backend='auto', compact=True):
+    """Return the record encoder; non compact output is supported only by the json backend"""
+    assert backend in BACKENDS, 'Unknown backend {}'.format(backend)
+
+    if backend == 'orjson':
+        if orjson is None:
+            raise ImportError('orjson backend requested but orjson is not installed')
+        if not compact:
+            raise ValueError('orjson backend supports only compact output')
+        return _encode_orjson
+    if backend == 'auto' and compact and orjson is not None:
+        return _encode_orjson
+    return _encode_json
+
+
+def iter_questions(doc, clusters=True, labels=None):
+    """Yield (unity, module, cluster number or None, question) for every question of doc.
+
+    labels is an optional dict (document, uf, module) -> precomputed cluster labels
+    (see model.cluster_labels), with 1-based uf and module numbers.
+    """
+    for uf in doc.unities:
+        for module in uf.modules:
+            if clusters:
+                key = (doc.name, uf.number + 1, module.number + 1)
+                module_labels = labels.get(key) if labels else None
+                for i, cluster in enumerate(module.create_clusters(module_labels)):
+                    for question in cluster.questions:
+                        yield uf, module, i + 1, question
+            else:
+                for question in module.questions:
+                    yield uf, module, None, question
+
+
+def write_ndjson(docs, f, compact=True, backend='auto', clusters=True, labels=None):
+    """Write every question of docs (any iterable, consumed lazily) to text file f.
+
+    Return the number of records written.
+    """
+    encode = get_encoder(backend, compact)
+    count = 0
+
+    for doc in docs:
+        for uf, module, cluster, question in iter_questions(doc, clusters=clusters, labels=labels):
+            f.write(encode(doc, uf, module, cluster, question, compact))
+            f.write('\n')
+            count += 1
+
+    return count
+
+
+def export_library(files, path, fmt=None, **kwargs):
+    """Parse files one at a time and export them to the NDJSON file at path"""
+    def docs():
+        for file in files:
+            doc = populate_document(file, write_clusters=False, fmt=fmt)
+            doc.check()
+            yield doc
+
+    with output.atomic_writer(path) as f:
+        return write_ndjson(docs(), f, **kwargs)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('folder', type=str, help='The folder of Word documents to parse')
+    parser.add_argument('-o', '--output', type=str, default='generated/library.ndjson', help='NDJSON file to write')
+    parser.add_argument('-f', '--format', choices=list(FORMATS), default=None, help='Format of the documents (default: detected per document)')
+    parser.add_argument('-b', '--backend', choices=BACKENDS, default='auto', help='JSON encoder (auto: orjson if installed, json with --pretty)')
+    parser.add_argument('--pretty', default=False, action='store_true', help='Use spaces after separators (json backend only, chosen automatically with auto)')
+    parser.add_argument('-nc', '--no-clusters', default=False, action='store_true', help='Don\'t compute clusters (cluster key will be null)')
+    args = parser.parse_args()
+
+    if args.pretty and args.backend == 'orjson':
+        parser.error('--pretty is not supported by the orjson backend')
+
+    q_dir = pathlib.Path(args.folder)
+    files = sorted(q_dir.glob('*.docx')) + sorted(q_dir.glob('*.doc'))
+
+    count = export_library(files, args.output, fmt=args.format, compact=not args.pretty,
+                           backend=args.backend, clusters=not args.no_clusters)
+    print(count, 'questions exported to', args.output)
+    print(output.stats)
@@ -1,5 +1,6 @@
 import html
 import os
+from functools import cached_property
 from typing import Union, Sequence
 from collections import defaultdict
 import textwrap
@@ -11,6 +12,8 @@ from sklearn.cluster import AgglomerativeClustering as Clustering
 import numpy as np
 import json
 
+import output
+
 
 def indent(text, amount, ch=' '):
     return textwrap.indent(text, amount * ch)
@@ -21,18 +24,24 @@ class Base(ABC):
         raise NotImplementedError
 
 
+CORRECT_HTML_TAG = '<input type="hidden" id="Corretta">'
+
+
 class Answer(Base):
     def __init__(self, name, is_correct):
         self.text = name.strip()
         self.is_correct = is_correct
 
-        self.html_escaped = '<p>{}</p>'.format(html.escape(self.text, False))
-        self.html = '<p>{}</p>'.format(self.text)
+    # html is rendered only when needed, then cached on the instance
+    @cached_property
+    def html(self):
+        s = '<p>{}</p>'.format(self.text)
+        return CORRECT_HTML_TAG + s if self.is_correct else s
 
-        if self.is_correct:
-            to_add = '<input type="hidden" id="Corretta">'
-            self.html_escaped = to_add + self.html_escaped
-            self.html = to_add + self.html
+    @cached_property
+    def html_escaped(self):
+        s = '<p>{}</p>'.format(html.escape(self.text, False))
+        return CORRECT_HTML_TAG + s if self.is_correct else s
 
     def check(self):
         assert self.text, 'Found empty text for answer!'
@@ -62,6 +71,10 @@ class Question(Base):
         self.jump2slides = None
         self.jump2slide = None
 
+    @cached_property
+    def html(self):
+        return '<p>{}</p>'.format(self.name)
+
     def set_jump2slides(self, j2s):
         self.jump2slides = j2s
         self.jump2slide = min(j2s)
@@ -169,8 +182,31 @@ class QuestionCluster(Base):
     def write_to_file(self, jsonpath: Union[str, os.PathLike]):
         jsonpath = pathlib.Path(jsonpath)
 
-        with open(jsonpath.with_suffix(".json"), "w") as f:
-            json.dump(self.todict(), f)
+        output.write_text(jsonpath.with_suffix(".json"), json.dumps(self.todict()))
+
+
+def cluster_labels(jump2slides: Sequence[int]):
+    """Agglomerative clustering of the slides to jump, with at least 3 questions per cluster"""
+    # create ndarray
+    X = np.array(jump2slides).reshape(-1, 1)
+
+    # media di clusters di 5 o 6 elementi
+    # max() per imporre minimo = 1
+    n = max(len(jump2slides) // 5, 1)
+
+    # do agglomerative clustering
+    linkage = "ward"
+    labels = Clustering(n, linkage=linkage).fit_predict(X)
+    treshold = 3
+    while n and any(value < treshold for value in Counter(labels).values()):
+        n -= 1
+        labels = Clustering(n, linkage=linkage).fit_predict(X)
+
+    if any(value < treshold for value in Counter(labels).values()):
+        msg = f"Cannot find clustering with counts labels >= {treshold}"
+        raise RuntimeError(msg)
+
+    return [int(label) for label in labels]
 
 
 class Module(Base):
@@ -191,28 +227,17 @@ class Module(Base):
             'There are still questions without the slide to jump yet!'
         self.questions_sorted.sort(key=lambda q: q.jump2slide)
 
-    def create_clusters(self) -> Sequence[QuestionCluster]:
+    def cluster_input(self):
+        """Data needed by cluster_labels (cheap to send to another process)"""
         # take sorted questions (doesn't change clustering)
-        questions = self.questions_sorted
+        return [q.jump2slide for q in self.questions_sorted]
 
-        # create ndarray
-        X = np.array([q.jump2slide for q in questions]).reshape(-1, 1)
-
-        # media di clusters di 5 o 6 elementi
-        # max() per imporre minimo = 1
-        n = max(len(questions) // 5, 1)
-
-        # do agglomerative clustering
-        linkage = "ward"
-        labels = Clustering(n, linkage=linkage).fit_predict(X)
-        treshold = 3
-        while n and any(value < treshold for value in Counter(labels).values()):
-            n -= 1
-            labels = Clustering(n, linkage=linkage).fit_predict(X)
+    def create_clusters(self, labels=None) -> Sequence[QuestionCluster]:
+        """Create clusters of sorted questions; labels can be precomputed with cluster_labels"""
+        questions = self.questions_sorted
 
-        if any(value < treshold for value in Counter(labels).values()):
-            msg = f"Cannot find clustering with counts labels >= {treshold}"
-            raise RuntimeError(msg)
+        if labels is None:
+            labels = cluster_labels(self.cluster_input())
 
         # create a list of questions for each label found by clustering
         questions_lists = defaultdict(list)
@@ -228,26 +253,25 @@ class Module(Base):
 
         return clusters
 
-    def write_cluster(self, root=None):
-        clusters = self.create_clusters()
+    def clusters_dict(self, labels=None):
+        clusters = self.create_clusters(labels)
 
-        thedict = dict(
+        return dict(
             count_clusters=len(clusters),
             clusters=[cluster.todict() for cluster in clusters]
         )
 
+    def cluster_path(self, root=None) -> pathlib.Path:
         root = root or ""
         name = f"uf_{self.unity.number + 1}_m_{self.number + 1}.json"
-        path = pathlib.Path("generated") / root / "cluster_json"
+        return pathlib.Path("generated") / root / "cluster_json" / name
 
-        # create path
-        os.makedirs(path, exist_ok=True)
+    def cluster_json(self, labels=None) -> str:
+        return json.dumps(self.clusters_dict(labels), indent=2, ensure_ascii=False)
 
-        # and set it to json file
-        path /= name
-
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(thedict, f, indent=2, ensure_ascii=False)
+    def write_cluster(self, root=None):
+        # write only if content changed (output creates the folder)
+        output.write_text(self.cluster_path(root), self.cluster_json())
 
     def check(self):
         assert self.questions, 'No question found for module {}'.format(self.name)
@@ -352,6 +376,16 @@ class Document(Base):
         s += '\n\n'.join([uf.str(**kwargs) for uf in self.unities])
         return s
 
+    @staticmethod
+    def questions_path(filepath):
+        if isinstance(filepath, str) and not filepath.endswith('.txt'):
+            filepath += '.txt'
+            filepath = 'generated/' + filepath
+        elif isinstance(filepath, pathlib.Path):
+            filepath = filepath.with_suffix('.txt').name
+            filepath = pathlib.Path('generated') / filepath
+        return filepath
+
     def print_questions(self, filepath=None, **kwargs):
         ordered = kwargs.get('ordered', True)
         separated = kwargs.get('separated', True)
@@ -361,14 +395,10 @@ class Document(Base):
         if not filepath:
             print(s)
         else:
-            if isinstance(filepath, str) and not filepath.endswith('.txt'):
-                filepath += '.txt'
-                filepath = 'generated/' + filepath
-            elif isinstance(filepath, pathlib.Path):
-                filepath = filepath.with_suffix('.txt').name
-                filepath = pathlib.Path('generated') / filepath
-
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.write(s)
-            print('Questions written on', filepath)
+            filepath = self.questions_path(filepath)
+
+            if output.write_text(filepath, s):
+                print('Questions written on', filepath)
+            else:
+                print('Questions unchanged on', filepath)
         return s
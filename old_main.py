@@ -1,114 +1,14 @@
-from collections import defaultdict
+# Kept for compatibility: the legacy format ("DOMANDA:", "RISPOSTA A ok", "slide")
+# is now a plugin of doc_parser and is detected automatically by main.py
 import pathlib
-import docx
-import re
 import argparse
 
+from doc_parser import populate_document as _populate_document
 from xml_builder import generate_xmls_per_module
-import model
 
 
-def populate_document(doc_pathlib):
-    counts = defaultdict(int)
-    uf_before, module_before, question_before, j2s_before = [None] * 4
-    model_doc = model.Document(doc_pathlib.stem)
-    try:
-        parsed_doc = docx.Document(str(doc_pathlib))
-    except Exception as e:
-        raise ValueError(str(e) + '.\nDocumento Word non valido oppure aperto e non salvato!')
-
-    uf_re = re.compile(r'(uf)[^a-z]*([^(]+)[(]?(\d+)?', re.IGNORECASE)
-    module_re = re.compile(r'(modulo)[^a-z]*([^(]+)[(]?(\d+)?', re.IGNORECASE)
-    question_re = re.compile(r'(domanda)[^a-zA-Z]*(.+)', re.IGNORECASE)
-    answer_re = re.compile(r'(RISPOSTA\s?[A-Z]?)[^\w]*(ok(?=\s+|-+))?[^\w]*(.*)')
-
-    for paragraph in parsed_doc.paragraphs:
-        text = paragraph.text.strip()
-        # eliminiamo caratteri unicode che danno problemi
-        text = text.replace('–', '-').replace('’', "'").replace('‘', "'").replace('“', '"').replace('”', '"')
-        for char, repl in zip('aeiouAEIOU', 'àèìòùÀÈÌÒÙ'):  # fix lettere accentate
-            text = text.replace("{}'".format(char), repl)
-        text = re.sub(r'\s+', ' ', text)  # sostituiamo più spazi con uno solo
-        test = text.lower().strip()
-
-        if test.startswith('uf'):
-            groups = uf_re.search(text).groups()
-            name, duration = groups[1:3]
-            uf = model.Unity(counts['uf'], name, duration)
-            model_doc.add_unity(uf)
-
-            uf_before = uf
-            module_before, question_before = [None] * 2
-
-            counts['uf'] += 1
-            for kw in ('module', 'question'):
-                counts[kw] = 0
-
-        elif test.startswith('modulo'):
-            assert uf_before, 'Found module without unity!'
-
-            groups = module_re.search(text).groups()
-            name, duration = groups[1:3]
-            module = model.Module(counts['module'], name, duration, unity=uf_before)
-            uf_before.add_module(module)
-
-            module_before = module
-            question_before = None
-            j2s_before = None
-
-            counts['module'] += 1
-            counts['question'] = 0
-
-        elif test.startswith('domanda'):
-            assert module_before, 'Found question without module!'
-
-            name = question_re.search(text).group(2)
-            question = model.Question(counts['question'], counts['global_question'], name, module=module_before)
-            module_before.add_question(question)
-
-            question_before = question
-
-            if j2s_before:
-                question_before.set_jump2slides(j2s_before)
-
-            counts['question'] += 1
-            counts['global_question'] += 1
-
-        elif test.startswith('risposta'):
-            assert question_before, 'Found answer without question!'
-
-            groups = answer_re.search(text).groups()
-            is_correct, name = groups[1:3]
-            is_correct = True if is_correct else False  # fix None
-
-            answer = model.Answer(name, is_correct)
-            question_before.add_answer(answer)
-        elif test.replace('*', '').strip().startswith('slide'):
-            # assert question_before, 'Found jump to slide without question!'
-            slides = set([int(el) for el in re.findall(r'(\d+)', test)])
-
-            # se ho una question before e trovo nuove slides, se
-            # il controllo di validità fallisce allora queste slides sono le sue
-            if question_before:
-                try:
-                    question_before.check()
-                except AssertionError:
-                    question_before.set_jump2slides(slides)
-                # se invece non fallisce, allora queste nuove slides vanno memorizzate
-                # per la prossima question
-                else:
-                    j2s_before = slides
-            # se non ho una question before, allora salva queste slides
-            else:
-                j2s_before = slides
-
-    # sort questions based on jump2slide
-    for uf in model_doc.unities:
-        for module in uf.modules:
-            module.sort_questions()
-            module.write_cluster(root=model_doc.name)
-
-    return model_doc
+def populate_document(doc_pathlib, data=None, write_clusters=True):
+    return _populate_document(doc_pathlib, data=data, write_clusters=write_clusters, fmt='legacy')
 
 
 # begin main
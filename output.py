@@ -0,0 +1,130 @@
+import contextlib
+import hashlib
+import os
+import pathlib
+import tempfile
+
+
+class WriteStats:
+    """Keep track of which generated files were really changed by a run"""
+
+    def __init__(self):
+        self.changed = []
+        self.unchanged = []
+
+    def reset(self):
+        self.changed.clear()
+        self.unchanged.clear()
+
+    def __str__(self):
+        return '{c} file(s) changed, {u} unchanged'.format(c=len(self.changed), u=len(self.unchanged))
+
+
+# statistiche globali di processo, lette da main.py a fine run
+stats = WriteStats()
+
+# mkstemp crea file con permessi 0600: usiamo quelli che avrebbe dato open()
+_umask = os.umask(0)
+os.umask(_umask)
+_FILE_MODE = 0o666 & ~_umask
+
+
+def _file_digest(path, chunk_size=1 << 16):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.digest()
+
+
+def is_unchanged(path, data: bytes) -> bool:
+    """True if file at path already contains exactly data"""
+    try:
+        size = os.stat(path).st_size
+    except FileNotFoundError:
+        return False
+
+    # se la dimensione è diversa non serve calcolare il digest
+    if size != len(data):
+        return False
+
+    return _file_digest(path) == hashlib.sha256(data).digest()
+
+
+def write_bytes(path, data: bytes) -> bool:
+    """Write data to path only if content differs, replacing the file atomically.
+
+    Return True if the file was (re)written, False if it was left untouched.
+    """
+    path = pathlib.Path(path)
+
+    if is_unchanged(path, data):
+        stats.unchanged.append(path)
+        return False
+
+    os.makedirs(path.parent, exist_ok=True)
+
+    # scriviamo su un file temporaneo nella stessa cartella e poi rinominiamo,
+    # così un'interruzione non lascia mai un file scritto a metà
+    fd, tmp_path = tempfile.mkstemp(prefix='.{}.'.format(path.name), suffix='.tmp', dir=path.parent)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, _FILE_MODE)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+    stats.changed.append(path)
+    return True
+
+
+@contextlib.contextmanager
+def atomic_writer(path, encoding='utf-8'):
+    """Context manager for streaming large outputs with the same guarantees of write_bytes.
+
+    Content is written to a temp file; on exit the temp file is discarded if equal
+    to the existing one, otherwise it atomically replaces it.
+    """
+    path = pathlib.Path(path)
+    os.makedirs(path.parent, exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(prefix='.{}.'.format(path.name), suffix='.tmp', dir=path.parent)
+    try:
+        with os.fdopen(fd, 'w', encoding=encoding, newline='') as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+
+        if path.exists() and os.stat(path).st_size == os.stat(tmp_path).st_size \
+                and _file_digest(path) == _file_digest(tmp_path):
+            os.unlink(tmp_path)
+            stats.unchanged.append(path)
+        else:
+            os.chmod(tmp_path, _FILE_MODE)
+            os.replace(tmp_path, path)
+            stats.changed.append(path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def encode_text(text: str, encoding='utf-8') -> bytes:
+    """Encode text as open(path, 'w') would write it, translating '\\n' to the platform line ending"""
+    if os.linesep != '\n':
+        text = text.replace('\n', os.linesep)
+    return text.encode(encoding)
+
+
+def write_text(path, text: str, encoding='utf-8') -> bool:
+    """Same as write_bytes, but for text content"""
+    return write_bytes(path, encode_text(text, encoding))
@@ -1,23 +1,49 @@
-import os
-
 from lxml.etree import Element, SubElement, tostring, parse, XMLSchema, CDATA
 import pathlib
 import warnings
 
+import output
+
+
+# constant fragments, built once per process
+CORRECT_FEEDBACK = CDATA('<p>Risposta Esatta</p>')
+WRONG_FEEDBACK = CDATA('<p>Risposta Errata</p>')
+DEFAULT_GRADE = str(float(1))
+PENALTY = str(float(0))
+
 
 def generate_xmls_per_module(doc, print_=True):
+    changed = 0
     for unity in doc.unities:
         for module in unity.modules:
-            i, j = unity.number, module.number
-            name = 'uf_{}_module_{}'.format(i+1, j+1)
-            make_xml(module, name, doc.name, print_)
+            changed += make_xml(module, module_xml_name(module), doc.name, print_)
+    return changed
 
 
-def make_xml(module, fname, docname, print_):
+def module_xml_name(module):
+    i, j = module.unity.number, module.number
+    return 'uf_{}_module_{}'.format(i+1, j+1)
+
+
+def xml_path(fname, docname):
     fname = fname.lower()
     if not fname.endswith('.xml'):
         fname += '.xml'
 
+    return pathlib.Path() / 'generated' / docname / "questions_xml" / fname
+
+
+def make_xml(module, fname, docname, print_):
+    path = xml_path(fname, docname)
+    changed = output.write_bytes(path, build_xml(module))
+
+    if print_:
+        print(path.name, 'written into' if changed else 'unchanged in', path.parent)
+
+    return changed
+
+
+def build_xml(module) -> bytes:
     # root of the xml file
     root = Element('quiz')
 
@@ -44,16 +70,16 @@ def make_xml(module, fname, docname, print_):
 
         questiontext = SubElement(question, 'questiontext', {'format': 'html'})
         text = SubElement(questiontext, 'text')
-        text.text = CDATA('<p>{}</p>'.format(q.name))
+        text.text = CDATA(q.html)
 
         generalfeedback = SubElement(question, 'generalfeedback', {'format': 'html'})
         _ = SubElement(generalfeedback, 'text')
 
         defaultgrade = SubElement(question, 'defaultgrade')
-        defaultgrade.text = str(float(1))
+        defaultgrade.text = DEFAULT_GRADE
 
         penalty = SubElement(question, 'penalty')
-        penalty.text = str(float(0))
+        penalty.text = PENALTY
 
         hidden = SubElement(question, 'hidden')
         hidden.text = str(0)
@@ -93,7 +119,7 @@ def make_xml(module, fname, docname, print_):
 
             feedback = SubElement(answer, 'feedback', {'format': 'html'})
             text = SubElement(feedback, 'text')
-            text.text = CDATA('<p>Risposta Esatta</p>' if ans.is_correct else '<p>Risposta Errata</p>')
+            text.text = CORRECT_FEEDBACK if ans.is_correct else WRONG_FEEDBACK
 
     # assert xml generated is valid
     schema_path = pathlib.Path() / 'schema.xsd'
@@ -106,13 +132,4 @@ def make_xml(module, fname, docname, print_):
         warnings.warn(schema_warn, ResourceWarning)
 
     # write to xml obj
-    xml_obj = tostring(root, pretty_print=True, xml_declaration=True, encoding='UTF-8')
-
-    # write to xml file
-    generated_dir = pathlib.Path() / 'generated' / docname / "questions_xml"
-    os.makedirs(generated_dir, exist_ok=True)
-    with open(generated_dir / fname, 'wb') as f:
-        f.write(xml_obj)
-
-    if print_:
-        print(fname, 'written into', generated_dir)
+    return tostring(root, pretty_print=True, xml_declaration=True, encoding='UTF-8')